@@ -1,7 +1,6 @@
 import asyncio
 import time
 from datetime import datetime, timedelta
-import pandas as pd
 import numpy as np
 from typing import Dict, List
 import logging
@@ -39,9 +38,8 @@ class CompleteRealTimeSystemFixed:
     def calculate_time_to_expiry(self, expiry_str: str) -> float:
         """Calculate time to expiry in years"""
         try:
-            expiry_date = pd.to_datetime(expiry_str)
-            now = pd.Timestamp.now()
-            time_diff = (expiry_date - now).total_seconds()
+            # int64 subtraction on datetime64 — no pandas Timestamp objects
+            time_diff = int(np.datetime64(expiry_str, 's') - np.datetime64('now', 's'))
             years = time_diff / (365.25 * 24 * 3600)
             return max(0.001, years)  # Minimum 1 day
         except:
@@ -220,12 +218,13 @@ async def main():
     await system.run()
 
 if __name__ == "__main__":
-    # Check dependencies
+    # Fail fast on missing dependencies — no network installs at startup
     try:
         import scipy
     except ImportError:
-        print("Installing scipy...")
-        import subprocess
-        subprocess.run(["pip3", "install", "--user", "scipy"])
-    
+        raise SystemExit(
+            "scipy is required but not installed. "
+            "Run: pip install -r requirements.txt"
+        )
+
     asyncio.run(main())
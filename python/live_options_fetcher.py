@@ -235,17 +235,21 @@ class LiveOptionsDataFetcher:
             self.logger.error(f"Error fetching MarketData.app data for {symbol}: {e}")
             return None
     
+    def _fetch_one(self, symbol: str) -> Optional[Dict]:
+        """Fetch live data for a single symbol (yFinance is the primary source)"""
+        return self._fetch_yfinance_data(symbol)
+
     def fetch_live_data(self, symbols: List[str]) -> Dict[str, Dict]:
         """Fetch live data for multiple symbols"""
         results = {}
-        
+
         with ThreadPoolExecutor(max_workers=3) as executor:
             # Try multiple sources for redundancy
             futures = {}
-            
+
             for symbol in symbols:
                 # Try yFinance first (most reliable for free data)
-                future = executor.submit(self._fetch_yfinance_data, symbol)
+                future = executor.submit(self._fetch_one, symbol)
                 futures[future] = (symbol, 'yfinance')
             
             # Collect results
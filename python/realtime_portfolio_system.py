@@ -1,16 +1,40 @@
 import asyncio
+import queue
+import random
+import sys
+import threading
 import time
 from datetime import datetime, timedelta
-import pandas as pd
 import numpy as np
 from typing import Dict, List
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 # Import WORKING components (using correct names)
-from safe_gpu_interface import SafeGPUInterface
+from safe_gpu_interface import SafeGPUInterface, OptionsBatch
 from live_options_fetcher import LiveOptionsDataFetcher
 
+@dataclass(slots=True)
+class CycleStats:
+    """Slotted per-cycle counters — no dict lookups on the hot path and
+    safe to read concurrently from the background logging thread"""
+    updates: int = 0
+    successful_updates: int = 0
+    total_processed: int = 0
+    total_time_ns: int = 0  # cumulative integer ns: exact, no FP roundoff
+
+    @property
+    def avg_time(self):
+        """Mean cycle time in seconds (display only)"""
+        return self.total_time_ns / max(1, self.successful_updates) / 1e9
+
+    def add(self, elapsed_ns, processed):
+        """Record a successful cycle"""
+        self.updates += 1
+        self.successful_updates += 1
+        self.total_processed += processed
+        self.total_time_ns += elapsed_ns
+
 class RealtimePortfolioSystemFixed:
     def __init__(self):
         # Setup logging
@@ -24,112 +48,128 @@ class RealtimePortfolioSystemFixed:
         # Configuration
         self.tracked_symbols = ['AAPL', 'MSFT', 'GOOGL', 'TSLA', 'NVDA', 'META', 'AMZN', 'NFLX', 'SPY', 'QQQ']
         self.update_interval = 2  # seconds
+        self.max_concurrent_fetches = 5  # cap on outbound HTTP requests
         self.running = False
+        self._backoff = 1.0  # seconds; doubles on failure, resets on success
         
         # Stats tracking
-        self.stats = {
-            'updates': 0,
-            'successful_updates': 0,
-            'total_processed': 0,
-            'avg_time': 0.0
-        }
+        self.stats = CycleStats()
+
+        # Background status logger — keeps blocking stdout syscalls off the
+        # asyncio event loop (slow terminals/pipes no longer stall cycles)
+        self._log_q = queue.SimpleQueue()
+        self._log_thread = threading.Thread(target=self._drain_log, daemon=True)
+        self._log_thread.start()
+
+    def _drain_log(self):
+        """Write queued status blocks to stdout from a background thread"""
+        while True:
+            sys.stdout.write(self._log_q.get())
+            sys.stdout.flush()
 
     # 🚀 OPTIMIZED: True Parallel Data Fetching
+    async def _fetch_symbol_async(self, symbol, semaphore):
+        """Fetch one symbol off the event loop, respecting the concurrency cap"""
+        async with semaphore:
+            return await asyncio.to_thread(self.data_fetcher._fetch_one, symbol)
+
     async def fetch_all_symbols_async(self):
-        """🚀 OPTIMIZED: Use parallel processing with proper worker count"""
-        fetch_start = time.time()
-        
-        loop = asyncio.get_event_loop()
-        
+        """🚀 OPTIMIZED: Dispatch all per-symbol fetches concurrently via asyncio.gather"""
+        fetch_start = time.perf_counter_ns()
+
         # Method 1: Try parallel individual fetches
         try:
-            # ✅ PARALLEL APPROACH: Multiple workers
-            with ThreadPoolExecutor(max_workers=5) as executor:  # 5 parallel workers
-                tasks = []
-                
-                # Create individual fetch tasks
-                for symbol in self.tracked_symbols:
-                    task = loop.run_in_executor(
-                        executor,
-                        lambda s=symbol: self.data_fetcher.fetch_live_data([s])
-                    )
-                    tasks.append((symbol, task))
-                
-                # Execute all tasks in parallel
-                results = await asyncio.gather(*[task for _, task in tasks], return_exceptions=True)
-                
-                # Combine results
-                live_data = {}
-                successful_symbols = 0
-                
-                for (symbol, _), result in zip(tasks, results):
-                    if not isinstance(result, Exception) and result and symbol in result:
-                        live_data[symbol] = result[symbol]
-                        successful_symbols += 1
-                    else:
-                        self.logger.warning(f"Failed to fetch {symbol}")
-                
-                fetch_time = time.time() - fetch_start
-                print(f"⚡ Parallel fetch: {fetch_time*1000:.1f}ms ({successful_symbols}/{len(self.tracked_symbols)} symbols)")
-                
-                return live_data if live_data else None
-                
+            # ✅ PARALLEL APPROACH: one to_thread task per symbol, HTTP round-trips overlap
+            semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+            results = await asyncio.gather(
+                *[self._fetch_symbol_async(symbol, semaphore)
+                  for symbol in self.tracked_symbols],
+                return_exceptions=True
+            )
+
+            # Zip results back into a dict keyed by symbol
+            live_data = {}
+            successful_symbols = 0
+
+            for symbol, result in zip(self.tracked_symbols, results):
+                if not isinstance(result, Exception) and result:
+                    live_data[symbol] = result
+                    successful_symbols += 1
+                else:
+                    self.logger.warning(f"Failed to fetch {symbol}")
+
+            fetch_ns = time.perf_counter_ns() - fetch_start
+            print(f"⚡ Parallel fetch: {fetch_ns/1e6:.1f}ms ({successful_symbols}/{len(self.tracked_symbols)} symbols)")
+
+            return live_data if live_data else None
+
         except Exception as e:
             self.logger.warning(f"Parallel fetch failed: {e}, falling back to batch mode")
-            
+
             # Method 2: Fallback to batch mode (but still async)
             try:
-                live_data = await loop.run_in_executor(
-                    None, 
-                    self.data_fetcher.fetch_live_data, 
+                live_data = await asyncio.to_thread(
+                    self.data_fetcher.fetch_live_data,
                     self.tracked_symbols
                 )
-                
-                fetch_time = time.time() - fetch_start
+
+                fetch_ns = time.perf_counter_ns() - fetch_start
                 successful_symbols = len(live_data) if live_data else 0
-                print(f"⚡ Batch fetch: {fetch_time*1000:.1f}ms ({successful_symbols}/{len(self.tracked_symbols)} symbols)")
-                
+                print(f"⚡ Batch fetch: {fetch_ns/1e6:.1f}ms ({successful_symbols}/{len(self.tracked_symbols)} symbols)")
+
                 return live_data
-                
+
             except Exception as e2:
                 self.logger.error(f"All fetch methods failed: {e2}")
                 return None
 
-    def time_to_expiry(self, expiry_str):
-        """Calculate time to expiry in years"""
-        try:
-            expiry_dt = pd.to_datetime(expiry_str)
-            now = pd.Timestamp.now()
-            delta = (expiry_dt - now).total_seconds() / (365.25 * 24 * 3600)
-            return max(delta, 0.001)  # Minimum 1 day
-        except Exception:
-            return 0.25  # Default 3 months
-
-    def prepare_options_data(self, live_data):
-        """OPTIMIZED: Streamlined data processing"""
-        options = []
+    _SUMMARY_DTYPE = [('symbol', 'U16'), ('spot', 'f4'), ('n_opts', 'i4')]
+
+    def _extract_summary(self, live_data):
+        """Canonical one-pass extraction of (symbol, spot, n_opts) per symbol
+
+        Built once per cycle and shared by prepare_options_data and
+        print_system_status, replacing their duplicated isinstance/getattr
+        fallback chains over the dict-of-dicts.
+        """
+        records = []
+        for symbol, data in live_data.items():
+            if isinstance(data, dict):
+                if 'market_data' in data:
+                    spot = getattr(data['market_data'], 'spot_price', 0)
+                else:
+                    spot = data.get('spot_price', 0)
+                n_opts = len(data.get('options', []))
+            else:
+                spot = getattr(data, 'spot_price', 0)
+                n_opts = len(getattr(data, 'options', []))
+            records.append((symbol, float(spot), n_opts))
+
+        if not records:
+            return np.recarray(0, dtype=self._SUMMARY_DTYPE)
+        return np.rec.fromrecords(records, dtype=self._SUMMARY_DTYPE)
+
+    def prepare_options_data(self, live_data, summary=None):
+        """OPTIMIZED: Build contiguous SoA arrays for a single GPU handoff"""
+        selected = []  # (symbol, strike, spot, expiry, iv, is_call, last) tuples
         market_data = {}
-        
-        processing_start = time.time()
+
+        processing_start = time.perf_counter_ns()
+
+        if summary is None:
+            summary = self._extract_summary(live_data)
+        spot_by_symbol = {str(rec.symbol): float(rec.spot) for rec in summary}
 
         for symbol, data in live_data.items():
             try:
-                # Fast extraction
-                if isinstance(data, dict):
-                    if 'market_data' in data:
-                        market_info = data['market_data']
-                        spot_price = getattr(market_info, 'spot_price', 0)
-                    else:
-                        spot_price = data.get('spot_price', 0)
-                    options_list = data.get('options', [])
-                else:
-                    spot_price = getattr(data, 'spot_price', 0)
-                    options_list = getattr(data, 'options', [])
+                spot_price = spot_by_symbol.get(symbol, 0.0)
+                options_list = (data.get('options', []) if isinstance(data, dict)
+                                else getattr(data, 'options', []))
 
                 market_data[symbol] = {'spot_price': float(spot_price)}
 
-                # 🚀 VECTORIZED PROCESSING
-                processed_options = []
+                # Collect lightweight tuples — array packing happens once below
+                symbol_options = []
                 for opt in options_list:
                     try:
                         if isinstance(opt, dict):
@@ -150,127 +190,173 @@ class RealtimePortfolioSystemFixed:
                         # Minimal validation for speed
                         strike_val = float(strike)
                         spot_val = float(spot_price)
-                        
+
                         if strike_val > 0 and spot_val > 0:
-                            processed_options.append({
-                                'symbol': symbol,
-                                'strike': strike_val,
-                                'spot_price': spot_val,
-                                'time_to_expiry': self.time_to_expiry(expiry),
-                                'risk_free_rate': 0.05,
-                                'implied_volatility': max(float(iv), 0.05),
-                                'is_call': str(opt_type).lower() == 'call',
-                                'market_price': float(last_price),
-                                'volume': float(volume)
-                            })
+                            symbol_options.append((
+                                float(volume),
+                                (symbol, strike_val, spot_val, expiry,
+                                 max(float(iv), 0.05),
+                                 str(opt_type).lower() == 'call',
+                                 float(last_price))
+                            ))
 
                     except:
                         continue  # Skip invalid options silently
 
                 # Take top options by volume
-                processed_options.sort(key=lambda x: -abs(x.get('volume', 0)))
-                options.extend(processed_options[:100])  # 100 per symbol
+                symbol_options.sort(key=lambda x: -abs(x[0]))
+                selected.extend(entry for _, entry in symbol_options[:100])  # 100 per symbol
 
             except Exception as e:
                 self.logger.error(f"Error processing symbol {symbol}: {e}")
                 market_data[symbol] = {'spot_price': 0.0}
 
-        processing_time = time.time() - processing_start
-        print(f"🔄 Data processing: {processing_time*1000:.1f}ms ({len(options)} options)")
-        
-        return options, market_data
+        # 🔥 SINGLE-PASS ARRAY FILL: preallocate contiguous buffers for every field
+        total_opts = len(selected)
+        symbols = [None] * total_opts
+        expiry_strs = [None] * total_opts
+        strike_arr = np.empty(total_opts, dtype=np.float32)
+        spot_arr = np.empty(total_opts, dtype=np.float32)
+        rate_arr = np.full(total_opts, 0.05, dtype=np.float32)
+        iv_arr = np.empty(total_opts, dtype=np.float32)
+        flag_arr = np.empty(total_opts, dtype=np.int8)
+        price_arr = np.empty(total_opts, dtype=np.float32)
+
+        for i, (symbol, strike, spot, expiry, iv, is_call, last) in enumerate(selected):
+            symbols[i] = symbol
+            expiry_strs[i] = expiry
+            strike_arr[i] = strike
+            spot_arr[i] = spot
+            iv_arr[i] = iv
+            flag_arr[i] = 1 if is_call else -1  # branchless call/put selector
+            price_arr[i] = last
+
+        # 🚀 VECTORIZED EXPIRY PARSING: one datetime64 cast for the whole
+        # batch — pure int64 arithmetic, no pandas Timestamp objects
+        if total_opts > 0:
+            try:
+                seconds_left = (np.array(expiry_strs, dtype='datetime64[s]')
+                                - np.datetime64('now', 's')).astype(np.int64)
+                expiry_arr = np.maximum(
+                    (seconds_left / 31557600.0).astype(np.float32),  # 365.25d years
+                    np.float32(0.001))  # Minimum 1 day
+            except Exception:
+                expiry_arr = np.full(total_opts, 0.25, dtype=np.float32)  # Default 3 months
+        else:
+            expiry_arr = np.empty(0, dtype=np.float32)
+
+        batch = OptionsBatch(
+            symbols=symbols,
+            strike=strike_arr,
+            spot_price=spot_arr,
+            time_to_expiry=expiry_arr,
+            risk_free_rate=rate_arr,
+            implied_volatility=iv_arr,
+            flag=flag_arr,
+            market_price=price_arr
+        )
+
+        processing_ns = time.perf_counter_ns() - processing_start
+        print(f"🔄 Data processing: {processing_ns/1e6:.1f}ms ({total_opts} options)")
+
+        return batch, market_data
+
+    def print_system_status(self, summary, processed_count, elapsed_ns, greeks):
+        """Display system status with performance breakdown
+
+        Builds one formatted block and hands it to the background logging
+        thread — no blocking print calls on the event loop's hot path.
+        summary is the per-symbol recarray from _extract_summary.
+        """
+        lines = []
+        lines.append(f"\n📈 MARKET DATA:")
+        total_options = int(summary.n_opts.sum()) if len(summary) else 0
+
+        for rec in summary:
+            symbol = str(rec.symbol)
+            spot = float(rec.spot)
+            opts_count = int(rec.n_opts)
+
+            position = self.gpu_interface.get_positions().get(symbol, {})
+            pnl = 0
+            if position:
+                pnl = (spot - position.get('entry_price', 0)) * position.get('quantity', 0)
+
+            lines.append(f"  {symbol}: ${spot:>8.2f} | {opts_count:>3d} options | "
+                         f"Pos: {position.get('quantity', 0):>4d} | P&L: ${pnl:>+8,.0f}")
+
+        lines.append(f"\n💰 PORTFOLIO GREEKS:")
+        lines.append(f"  Delta:       {greeks.total_delta:>8.3f}   (Price sensitivity)")
+        lines.append(f"  Vega:        {greeks.total_vega:>8.3f}   (Volatility sensitivity)")
+        lines.append(f"  Gamma:     {greeks.total_gamma:>10.6f}   (Delta acceleration)")
+        lines.append(f"  Theta:       {greeks.total_theta:>8.3f}   (Time decay)")
+        lines.append(f"  Rho:         {greeks.total_rho:>8.3f}   (Interest rate sensitivity)")
+        lines.append(f"  P&L:    ${greeks.total_pnl:>11,.2f}   (Unrealized P&L)")
+
+        lines.append(f"\n⚡ PERFORMANCE:")
+        lines.append(f"  Processing Time:       {elapsed_ns/1e6:>8.1f} ms")
+        lines.append(f"  Options Processed:     {processed_count:>8d}")
+        lines.append(f"  Total Available:       {total_options:>8d}")
+        lines.append(f"  Success Rate:          {self.stats.successful_updates/max(1,self.stats.updates)*100:>8.1f}%")
+        lines.append(f"  Updates Completed:     {self.stats.updates:>8d}")
+        lines.append(f"  Compute Method:        {'GPU' if self.gpu_interface.use_gpu else 'CPU':>8s}")
+
+        self._log_q.put('\n'.join(lines) + '\n')
+
+    async def update_cycle(self, live_data=None):
+        """🚀 OPTIMIZED: Execute one complete update cycle
+
+        live_data may be handed in pre-fetched by run()'s pipeline; if not,
+        it is fetched here (parallel per-symbol).
+        """
+        start_time = time.perf_counter_ns()
 
-    def print_system_status(self, live_data, processed_count, elapsed_time, greeks, market_data):
-        """Display system status with performance breakdown"""
-        print(f"\n📈 MARKET DATA:")
-        total_options = 0
-        
-        for symbol in self.tracked_symbols:
-            if symbol in live_data:
-                # ✅ FIXED: Use the processed market_data
-                spot = market_data.get(symbol, {}).get('spot_price', 0)
-                
-                data = live_data[symbol]
-                if isinstance(data, dict):
-                    opts_count = len(data.get('options', []))
-                else:
-                    opts_count = len(getattr(data, 'options', []))
-                
-                total_options += opts_count
-                
-                position = self.gpu_interface.get_positions().get(symbol, {})
-                pnl = 0
-                if position:
-                    pnl = (spot - position.get('entry_price', 0)) * position.get('quantity', 0)
-                
-                print(f"  {symbol}: ${spot:>8.2f} | {opts_count:>3d} options | "
-                      f"Pos: {position.get('quantity', 0):>4d} | P&L: ${pnl:>+8,.0f}")
-
-        print(f"\n💰 PORTFOLIO GREEKS:")
-        print(f"  Delta:       {greeks.total_delta:>8.3f}   (Price sensitivity)")
-        print(f"  Vega:        {greeks.total_vega:>8.3f}   (Volatility sensitivity)")
-        print(f"  Gamma:     {greeks.total_gamma:>10.6f}   (Delta acceleration)")
-        print(f"  Theta:       {greeks.total_theta:>8.3f}   (Time decay)")
-        print(f"  Rho:         {greeks.total_rho:>8.3f}   (Interest rate sensitivity)")
-        print(f"  P&L:    ${greeks.total_pnl:>11,.2f}   (Unrealized P&L)")
-
-        print(f"\n⚡ PERFORMANCE:")
-        print(f"  Processing Time:       {elapsed_time*1000:>8.1f} ms")
-        print(f"  Options Processed:     {processed_count:>8d}")
-        print(f"  Total Available:       {total_options:>8d}")
-        print(f"  Success Rate:          {self.stats['successful_updates']/max(1,self.stats['updates'])*100:>8.1f}%")
-        print(f"  Updates Completed:     {self.stats['updates']:>8d}")
-        print(f"  Compute Method:        {'GPU' if self.gpu_interface.use_gpu else 'CPU':>8s}")
-
-    async def update_cycle(self):
-        """🚀 OPTIMIZED: Execute one complete update cycle with parallel fetching"""
-        start_time = time.time()
-        
         try:
-            self.logger.info("Fetching live market data...")
-            
-            # 🚀 PARALLEL FETCHING
-            live_data = await self.fetch_all_symbols_async()
-            
+            if live_data is None:
+                self.logger.info("Fetching live market data...")
+                # 🚀 PARALLEL FETCHING
+                live_data = await self.fetch_all_symbols_async()
+
             if not live_data:
                 self.logger.warning("No live data received")
                 return False
 
-            # Process data for GPU computation
-            gpu_start = time.time()
-            options_data, market_data = self.prepare_options_data(live_data)
-            
-            if not options_data:
+            # One canonical traversal of the fetched data, shared below
+            summary = self._extract_summary(live_data)
+
+            # Process data for GPU computation (prints its own prepare timing)
+            batch, market_data = self.prepare_options_data(live_data, summary)
+
+            if len(batch) == 0:
                 self.logger.warning("No valid options data to process")
                 return False
 
-            # Process using GPU/CPU via SafeGPUInterface
-            processed_count = self.gpu_interface.process_portfolio_options(
-                options_data, market_data
+            # Process using GPU/CPU via SafeGPUInterface — one batch, one launch
+            gpu_start = time.perf_counter_ns()
+            processed_count = self.gpu_interface.process_portfolio_batch(
+                batch, market_data
             )
+            gpu_ns = time.perf_counter_ns() - gpu_start
+            print(f"🚀 GPU processing: {gpu_ns/1e6:.1f}ms")
+
             # Get computed Greeks
+            greeks_start = time.perf_counter_ns()
             greeks = self.gpu_interface.get_portfolio_greeks()
-            
-            gpu_time = time.time() - gpu_start
-            print(f"🚀 GPU processing: {gpu_time*1000:.1f}ms")
+            greeks_ns = time.perf_counter_ns() - greeks_start
+            print(f"💹 Greeks readback: {greeks_ns/1e6:.1f}ms")
 
             # Update statistics
-            elapsed_time = time.time() - start_time
-            self.stats['updates'] += 1
-            self.stats['successful_updates'] += 1
-            self.stats['total_processed'] += processed_count
-            self.stats['avg_time'] = (
-                self.stats['avg_time'] * (self.stats['updates'] - 1) + elapsed_time
-            ) / self.stats['updates']
+            elapsed_ns = time.perf_counter_ns() - start_time
+            self.stats.add(elapsed_ns, processed_count)
 
             # Display results
-            self.print_system_status(live_data, processed_count, elapsed_time, greeks, market_data)
+            self.print_system_status(summary, processed_count, elapsed_ns, greeks)
             
             return True
 
         except Exception as e:
             self.logger.error(f"Update cycle failed: {e}", exc_info=True)
-            self.stats['updates'] += 1
+            self.stats.updates += 1
             return False
 
     # ✅ FIXED: Added the missing run method
@@ -285,20 +371,46 @@ class RealtimePortfolioSystemFixed:
         print("🛑 Press Ctrl+C to stop\n")
 
         self.running = True
+        fetch_task = None
 
         try:
             while self.running:
-                cycle_start = time.time()
-                success = await self.update_cycle()
-                
+                cycle_start = time.perf_counter_ns()
+
+                # 🚀 DOUBLE-BUFFERED PIPELINE: await the data prefetched during
+                # the previous cycle's compute (cycle 1 awaits its own task so
+                # startup issues exactly one fetch round)
+                if fetch_task is None:
+                    fetch_task = asyncio.create_task(self.fetch_all_symbols_async())
+                live_data = await fetch_task
+
+                # Kick off cycle N+1's fetch now so the HTTP wait overlaps
+                # with cycle N's prepare/GPU/print phases below
+                fetch_task = asyncio.create_task(self.fetch_all_symbols_async())
+
+                if live_data is None:
+                    # Failed fetch round: count the cycle as failed here rather
+                    # than passing None to update_cycle, whose inline re-fetch
+                    # would overlap with the prefetch task just spawned above
+                    self.logger.warning("No live data received")
+                    success = False
+                else:
+                    success = await self.update_cycle(live_data)
+
                 if success:
-                    cycle_time = time.time() - cycle_start
+                    self._backoff = 1.0
+                    cycle_time = (time.perf_counter_ns() - cycle_start) / 1e9
                     next_update = datetime.now() + timedelta(seconds=self.update_interval)
                     print(f"\n⏰ Next update at {next_update.strftime('%H:%M:%S')} "
                           f"(cycle: {cycle_time:.1f}s, waiting {self.update_interval}s...)")
                 else:
-                    print("\n⚠️  Update failed, retrying in 5 seconds...")
-                    await asyncio.sleep(5)
+                    # Jittered exponential back-off: transient failures retry
+                    # in ~1s rather than a fixed long sleep, without letting
+                    # every instance hammer the API in lockstep
+                    delay = self._backoff + random.random() * 0.5
+                    self._backoff = min(self._backoff * 2, self.update_interval)
+                    print(f"\n⚠️  Update failed, retrying in {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
                     continue
 
                 await asyncio.sleep(self.update_interval)
@@ -308,15 +420,17 @@ class RealtimePortfolioSystemFixed:
         except Exception as e:
             self.logger.error(f"Fatal system error: {e}", exc_info=True)
         finally:
+            if fetch_task is not None:
+                fetch_task.cancel()
             self.stop()
 
     def stop(self):
         """Stop the system gracefully"""
         self.running = False
         print("✅ Real-Time GPU Portfolio System stopped")
-        print(f"📊 Final Stats: {self.stats['successful_updates']}/{self.stats['updates']} successful updates")
-        if self.stats['successful_updates'] > 0:
-            print(f"⚡ Average processing time: {self.stats['avg_time']:.2f}s per cycle")
+        print(f"📊 Final Stats: {self.stats.successful_updates}/{self.stats.updates} successful updates")
+        if self.stats.successful_updates > 0:
+            print(f"⚡ Average processing time: {self.stats.avg_time:.2f}s per cycle")
 
 # Main execution
 async def main():
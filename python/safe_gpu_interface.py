@@ -1,4 +1,5 @@
 import ctypes
+import math
 import os
 from typing import Dict, List
 import numpy as np
@@ -7,6 +8,162 @@ from dataclasses import dataclass
 from datetime import datetime
 import traceback
 
+# Optional cupy: lets the portfolio aggregation run on tensor cores
+try:
+    import cupy as cp
+    CUPY_AVAILABLE = True
+except ImportError:
+    cp = None
+    CUPY_AVAILABLE = False
+
+# Optional numba acceleration for the CPU fallback path
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """No-op decorator so the kernels below still run as plain Python"""
+        def wrap(func):
+            return func
+        return wrap
+
+
+@njit(cache=True, fastmath=True)
+def _norm_cdf(x):
+    """Standard normal CDF via the Abramowitz-Stegun 26.2.17 approximation
+
+    scipy.stats.norm is not numba-compatible, so the rational polynomial
+    is inlined here (max abs error ~7.5e-8, plenty for Greeks).
+    """
+    sign = 1.0
+    if x < 0.0:
+        sign = -1.0
+        x = -x
+    t = 1.0 / (1.0 + 0.2316419 * x)
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937
+               + t * (-1.821255978 + t * 1.330274429))))
+    cdf = 1.0 - 0.3989422804014327 * math.exp(-0.5 * x * x) * poly
+    if sign < 0.0:
+        return 1.0 - cdf
+    return cdf
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _bs_greeks_kernel(S, K, T, r, sigma, flag, delta, vega, gamma, theta, rho, price):
+    """Fused Black-Scholes price + all five Greeks over contiguous arrays
+
+    One prange iteration per option computes d1/d2/pdf/cdf/discount once
+    and emits all six outputs — each input is read a single time.
+    cache=True avoids recompiling the kernel on every process start.
+    flag is +1 for calls, -1 for puts and selects the call/put branch
+    arithmetically (N(-x) = 1 - N(x)), so the inner loop carries no
+    data-dependent branch to diverge on.
+    """
+    inv_sqrt2pi = 0.3989422804014327
+    for i in prange(S.shape[0]):
+        s = float(S[i])
+        k = float(K[i])
+        t = float(T[i])
+        rr = float(r[i])
+        sig = float(sigma[i])
+        f = float(flag[i])  # +1 call, -1 put
+
+        if t <= 0.0 or sig <= 0.0 or s <= 0.0 or k <= 0.0:
+            delta[i] = 0.0
+            vega[i] = 0.0
+            gamma[i] = 0.0
+            theta[i] = 0.0
+            rho[i] = 0.0
+            price[i] = 0.0
+            continue
+
+        sqrt_t = math.sqrt(t)
+        d1 = (math.log(s / k) + (rr + 0.5 * sig * sig) * t) / (sig * sqrt_t)
+        d2 = d1 - sig * sqrt_t
+        pdf_d1 = inv_sqrt2pi * math.exp(-0.5 * d1 * d1)
+        cdf_fd1 = _norm_cdf(f * d1)
+        cdf_fd2 = _norm_cdf(f * d2)
+        disc = math.exp(-rr * t)
+
+        delta[i] = f * cdf_fd1
+        rho[i] = f * k * t * disc * cdf_fd2
+        theta[i] = (-(s * pdf_d1 * sig) / (2.0 * sqrt_t)
+                    - f * rr * k * disc * cdf_fd2) / 365.0
+        gamma[i] = pdf_d1 / (s * sig * sqrt_t)
+        vega[i] = s * pdf_d1 * sqrt_t / 100.0  # Vega per 1% vol change
+        price[i] = f * (s * cdf_fd1 - k * disc * cdf_fd2)
+
+
+def _make_bs_kernel(flag_const, short_dated):
+    """Build a Greeks kernel specialized by partial evaluation
+
+    flag_const (+1 call / -1 put) is baked in as a compile-time constant,
+    so the generated code carries no per-element selection at all. The
+    short-dated variant (T < 1 day) computes the moneyness log via log1p,
+    which keeps d1 accurate for near-ATM strikes where log(S/K) loses
+    precision against the tiny sigma*sqrt(T) denominator.
+
+    Note: cache=True is omitted here — numba cannot disk-cache closures.
+    """
+    f = float(flag_const)
+    careful_log = short_dated
+
+    @njit(fastmath=True, parallel=True)
+    def kernel(idx, S, K, T, r, sigma, delta, vega, gamma, theta, rho, price):
+        inv_sqrt2pi = 0.3989422804014327
+        for j in prange(idx.shape[0]):
+            i = idx[j]
+            s = float(S[i])
+            k = float(K[i])
+            t = float(T[i])
+            rr = float(r[i])
+            sig = float(sigma[i])
+
+            if t <= 0.0 or sig <= 0.0 or s <= 0.0 or k <= 0.0:
+                delta[i] = 0.0
+                vega[i] = 0.0
+                gamma[i] = 0.0
+                theta[i] = 0.0
+                rho[i] = 0.0
+                price[i] = 0.0
+                continue
+
+            sqrt_t = math.sqrt(t)
+            if careful_log:
+                log_m = math.log1p((s - k) / k)
+            else:
+                log_m = math.log(s / k)
+            d1 = (log_m + (rr + 0.5 * sig * sig) * t) / (sig * sqrt_t)
+            d2 = d1 - sig * sqrt_t
+            pdf_d1 = inv_sqrt2pi * math.exp(-0.5 * d1 * d1)
+            cdf_fd1 = _norm_cdf(f * d1)
+            cdf_fd2 = _norm_cdf(f * d2)
+            disc = math.exp(-rr * t)
+
+            delta[i] = f * cdf_fd1
+            rho[i] = f * k * t * disc * cdf_fd2
+            theta[i] = (-(s * pdf_d1 * sig) / (2.0 * sqrt_t)
+                        - f * rr * k * disc * cdf_fd2) / 365.0
+            gamma[i] = pdf_d1 / (s * sig * sqrt_t)
+            vega[i] = s * pdf_d1 * sqrt_t / 100.0  # Vega per 1% vol change
+            price[i] = f * (s * cdf_fd1 - k * disc * cdf_fd2)
+
+    return kernel
+
+
+# Lazily-built (flag, short_dated) -> kernel specializations
+_SPECIALIZED_KERNELS = {}
+
+
+def _get_bs_kernel(flag_const, short_dated):
+    key = (flag_const, short_dated)
+    if key not in _SPECIALIZED_KERNELS:
+        _SPECIALIZED_KERNELS[key] = _make_bs_kernel(flag_const, short_dated)
+    return _SPECIALIZED_KERNELS[key]
+
 @dataclass
 class PortfolioGreeks:
     total_delta: float
@@ -17,6 +174,21 @@ class PortfolioGreeks:
     total_pnl: float
     timestamp: datetime
 
+@dataclass
+class OptionsBatch:
+    """Contiguous SoA arrays for one cycle's options (single GPU handoff)"""
+    symbols: List[str]
+    strike: np.ndarray              # float32
+    spot_price: np.ndarray          # float32
+    time_to_expiry: np.ndarray      # float32, years
+    risk_free_rate: np.ndarray      # float32
+    implied_volatility: np.ndarray  # float32
+    flag: np.ndarray                # int8, +1=call -1=put
+    market_price: np.ndarray        # float32
+
+    def __len__(self):
+        return len(self.symbols)
+
 class SafeGPUInterface:
     # C struct layout matching LiveOptionData in C++
     _C_STRUCT = np.dtype([
@@ -57,7 +229,56 @@ class SafeGPUInterface:
         }
         
         self.current_greeks = PortfolioGreeks(0, 0, 0, 0, 0, 0, datetime.now())
-        
+
+        # Persistent device-side SoA buffers (cupy) — grown to a high-water
+        # mark and overwritten in place instead of re-allocated per cycle
+        self._device_capacity = 0
+        self._d_S = self._d_K = self._d_T = self._d_sigma = self._d_qty = None
+        self._chain_key = None
+        # cupy can import fine on machines with no usable GPU — the first CUDA
+        # runtime call is what fails — so stream/event creation needs the same
+        # try/except treatment as every other cupy touchpoint here
+        self._h2d_stream = None
+        self._h2d_event = None
+        if CUPY_AVAILABLE:
+            try:
+                self._h2d_stream = cp.cuda.Stream(non_blocking=True)
+                # Recorded after each upload so consumers on other streams can
+                # order against the in-flight copies (non-blocking streams
+                # don't sync with the default stream on their own)
+                self._h2d_event = cp.cuda.Event()
+            except Exception as e:
+                print(f"⚠️ CUDA stream setup failed, device buffers disabled: {e}")
+                self._h2d_stream = None
+                self._h2d_event = None
+        self._d_qty_valid = 0  # options currently resident in _d_qty
+
+        # Incremental Greeks: previous cycle's inputs and outputs, reused for
+        # legs whose spot/vol didn't move (chains rarely change between cycles)
+        self._memo_chain_key = None
+        self._memo_S = None
+        self._memo_sigma = None
+        self._memo_greeks = None
+
+        # Pinned host landing buffer for the aggregated totals — one explicit
+        # async DMA copy per cycle instead of implicit per-value D2H syncs
+        # (16 floats to match the WMMA-padded GEMV output). cudaHostAlloc
+        # needs a working CUDA context, so this gets the same guard as the
+        # streams above — on failure the aggregation falls back to numpy BLAS
+        self._copy_stream = None
+        self._pinned_totals = None
+        self._h_totals = None
+        if CUPY_AVAILABLE:
+            try:
+                self._copy_stream = cp.cuda.Stream(non_blocking=True)
+                self._pinned_totals = cp.cuda.alloc_pinned_memory(16 * 4)
+                self._h_totals = np.frombuffer(self._pinned_totals, dtype=np.float32, count=16)
+            except Exception as e:
+                print(f"⚠️ Pinned buffer setup failed, using CPU aggregation: {e}")
+                self._copy_stream = None
+                self._pinned_totals = None
+                self._h_totals = None
+
         # Try to initialize GPU safely
         self._safe_gpu_init()
 
@@ -206,6 +427,83 @@ class SafeGPUInterface:
             print(f"Error in CPU Greeks: {e}")
             return {'delta': 0, 'vega': 0, 'gamma': 0, 'theta': 0, 'rho': 0}
 
+    def process_portfolio_batch(self, batch: OptionsBatch, market_data: Dict):
+        """🚀 OPTIMIZED: Process a full SoA batch with a single GPU handoff"""
+        total_greeks = {'delta': 0, 'vega': 0, 'gamma': 0, 'theta': 0, 'rho': 0, 'pnl': 0}
+
+        # Calculate P&L first
+        for symbol, data in market_data.items():
+            if symbol in self.portfolio_positions:
+                position = self.portfolio_positions[symbol]
+                spot_price = data.get('spot_price', 0)
+                total_greeks['pnl'] += (spot_price - position['entry_price']) * position['quantity']
+
+        n_options = len(batch)
+        if n_options == 0:
+            self._update_current_greeks(total_greeks)
+            return 0
+
+        processed_count = 0
+        if self.use_gpu and self.manager:
+            try:
+                # Pack the C struct array column-wise — no per-option Python objects
+                batch_array = np.empty(n_options, dtype=self._C_STRUCT)
+                batch_array['symbol'] = np.array(
+                    [s.encode('utf-8')[:15] for s in batch.symbols], dtype='S16')
+                batch_array['strike'] = batch.strike
+                batch_array['spot_price'] = batch.spot_price
+                batch_array['time_to_expiry'] = batch.time_to_expiry
+                batch_array['risk_free_rate'] = batch.risk_free_rate
+                batch_array['implied_volatility'] = batch.implied_volatility
+                batch_array['is_call'] = (batch.flag > 0).astype(np.int32)
+                batch_array['market_price'] = batch.market_price
+
+                # 🚀 SINGLE GPU CALL: one kernel launch for every symbol's options
+                self.lib.add_options_batch(
+                    self.manager,
+                    batch_array.ctypes.data_as(ctypes.c_void_p),
+                    ctypes.c_size_t(n_options)
+                )
+
+                processed_count = n_options
+                print(f"🚀 Batched GPU call: {processed_count} options in single transaction")
+
+            except Exception as e:
+                print(f"❌ GPU batch processing failed: {e}")
+                processed_count = 0
+
+        # CPU fallback for Greeks calculation (until GPU Greeks are fully connected)
+        # — one jitted pass over the whole batch instead of tuple-at-a-time Python
+        weights = np.empty(n_options, dtype=np.float32)
+        for i, symbol in enumerate(batch.symbols):
+            position = self.portfolio_positions.get(symbol)
+            weights[i] = position['quantity'] / 100.0 if position else 0.0
+
+        # Refresh the persistent device buffers (changed fields only)
+        self._upload_batch_to_device(batch, weights)
+
+        # FP32 matrix, one contiguous row per output (5 Greeks + model
+        # price, all from the fused kernel) — unchanged legs are served
+        # from the previous cycle's matrix
+        greeks_mat = self._compute_greeks_incremental(batch)
+
+        # Weight by position and reduce: one GEMV over the whole matrix
+        totals = self._aggregate_greeks(greeks_mat, weights)
+        total_greeks['delta'] += float(totals[0])
+        total_greeks['vega'] += float(totals[1])
+        total_greeks['gamma'] += float(totals[2])
+        total_greeks['theta'] += float(totals[3])
+        total_greeks['rho'] += float(totals[4])
+
+        # The fused kernel also emits model prices; their weighted sum is
+        # the options book value (weights are per-100-share contracts)
+        print(f"💵 Options book value (model): ${float(totals[5]) * 100.0:,.2f}")
+
+        # Update current Greeks
+        self._update_current_greeks(total_greeks)
+
+        return processed_count if processed_count > 0 else n_options
+
     def process_portfolio_options(self, options_data: List[Dict], market_data: Dict):
         """🚀 OPTIMIZED: Process entire batch with single GPU call"""
         total_greeks = {'delta': 0, 'vega': 0, 'gamma': 0, 'theta': 0, 'rho': 0, 'pnl': 0}
@@ -287,6 +585,214 @@ class SafeGPUInterface:
         
         return processed_count if processed_count > 0 else len(options_data)
 
+    @staticmethod
+    def _batch_chain_key(batch: OptionsBatch):
+        """Identity hash of the option chain, per contract and in order
+
+        The volume-ranked selection can reorder a call/put pair at the
+        same strike (or two expiries of one strike) between cycles while
+        the (symbols, strikes) sequence stays identical, so the key also
+        covers the call/put flag and the expiry quantized to whole days —
+        a position swap must read as a different chain, never as a cache
+        hit for the other contract.
+        """
+        expiry_days = np.round(batch.time_to_expiry * np.float32(365.25)).astype(np.int16)
+        return hash((tuple(batch.symbols), batch.strike.tobytes(),
+                     batch.flag.tobytes(), expiry_days.tobytes()))
+
+    def _compute_greeks_incremental(self, batch: OptionsBatch):
+        """Recompute Greeks only for legs whose spot or vol actually moved
+
+        When the chain hash matches the previous cycle, legs where both S
+        and sigma moved less than 1e-4 keep their cached Greeks; the rest
+        are compacted into a sub-batch, run through the kernel, and
+        scattered back. (Time decay across one cycle is ~2e-6 years and
+        well below Greek resolution; a chain roll forces a full recompute.)
+        """
+        n = len(batch)
+        chain_key = self._batch_chain_key(batch)
+
+        if (chain_key == self._memo_chain_key
+                and self._memo_greeks is not None
+                and self._memo_greeks.shape[1] == n):
+            changed = ((np.abs(batch.spot_price - self._memo_S) > 1e-4)
+                       | (np.abs(batch.implied_volatility - self._memo_sigma) > 1e-4))
+            greeks_mat = self._memo_greeks
+            idx = np.nonzero(changed)[0]
+            if idx.size:
+                # Compact changed rows, launch over them only, scatter back
+                sub = OptionsBatch(
+                    symbols=[batch.symbols[i] for i in idx],
+                    strike=np.ascontiguousarray(batch.strike[idx]),
+                    spot_price=np.ascontiguousarray(batch.spot_price[idx]),
+                    time_to_expiry=np.ascontiguousarray(batch.time_to_expiry[idx]),
+                    risk_free_rate=np.ascontiguousarray(batch.risk_free_rate[idx]),
+                    implied_volatility=np.ascontiguousarray(batch.implied_volatility[idx]),
+                    flag=np.ascontiguousarray(batch.flag[idx]),
+                    market_price=np.ascontiguousarray(batch.market_price[idx])
+                )
+                sub_mat = np.empty((6, idx.size), dtype=np.float32)
+                self._compute_batch_greeks(sub, sub_mat)
+                greeks_mat[:, idx] = sub_mat
+            print(f"♻️ Incremental Greeks: {idx.size}/{n} legs recomputed")
+        else:
+            greeks_mat = np.empty((6, n), dtype=np.float32)
+            self._compute_batch_greeks(batch, greeks_mat)
+
+        self._memo_chain_key = chain_key
+        self._memo_S = batch.spot_price.copy()
+        self._memo_sigma = batch.implied_volatility.copy()
+        self._memo_greeks = greeks_mat
+        return greeks_mat
+
+    def _compute_batch_greeks(self, batch: OptionsBatch, greeks_mat):
+        """Fill greeks_mat, using specialized kernels when numba is present
+
+        The batch is partitioned by precomputed (call/put, short-dated)
+        masks and each partition runs a kernel with those axes constant-
+        folded in; without numba the generic branchless kernel covers
+        everything in one plain-Python pass.
+        """
+        if NUMBA_AVAILABLE:
+            short = batch.time_to_expiry < np.float32(1.0 / 365.25)  # T < 1 day
+            for flag_const in (1, -1):
+                for short_dated in (False, True):
+                    idx = np.nonzero((batch.flag == flag_const)
+                                     & (short == short_dated))[0]
+                    if idx.size:
+                        _get_bs_kernel(flag_const, short_dated)(
+                            idx, batch.spot_price, batch.strike,
+                            batch.time_to_expiry, batch.risk_free_rate,
+                            batch.implied_volatility,
+                            greeks_mat[0], greeks_mat[1], greeks_mat[2],
+                            greeks_mat[3], greeks_mat[4], greeks_mat[5])
+        else:
+            _bs_greeks_kernel(
+                batch.spot_price, batch.strike, batch.time_to_expiry,
+                batch.risk_free_rate, batch.implied_volatility, batch.flag,
+                greeks_mat[0], greeks_mat[1], greeks_mat[2],
+                greeks_mat[3], greeks_mat[4], greeks_mat[5])
+
+    def _upload_batch_to_device(self, batch: OptionsBatch, weights):
+        """Keep option data resident on GPU and upload only what changed
+
+        Strikes identify the option chain and rarely change between 60s
+        cycles, so they re-upload only when the chain hash differs. Spot,
+        vol, time-to-expiry and position weights move every cycle and go up
+        on a dedicated non-blocking stream so the copies overlap with
+        compute. _d_qty feeds the aggregation GEMV directly; the other
+        buffers stage inputs for the device-side Greeks kernel.
+        """
+        if not CUPY_AVAILABLE or self._h2d_stream is None:
+            return
+        try:
+            n = len(batch)
+            if n > self._device_capacity:
+                # High-water-mark growth so steady-state cycles never realloc
+                capacity = max(2 * self._device_capacity, n)
+                self._d_S, self._d_K, self._d_T, self._d_sigma, self._d_qty = [
+                    cp.empty(capacity, dtype=cp.float32) for _ in range(5)]
+                self._device_capacity = capacity
+                self._chain_key = None
+                self._d_qty_valid = 0
+
+            chain_key = self._batch_chain_key(batch)
+            with self._h2d_stream:
+                if chain_key != self._chain_key:
+                    # Strikes ride the wire as int16 (half the PCIe payload)
+                    # and are dequantized to FP32 on device: cent resolution
+                    # up to $327, dime resolution up to $3276 (big underliers
+                    # like SPX). Beyond that int16 would wrap silently, so
+                    # the batch goes up unquantized instead
+                    k_max = float(batch.strike.max())
+                    if k_max < 327.0:
+                        k_scale = 100.0
+                    elif k_max < 3276.0:
+                        k_scale = 10.0
+                    else:
+                        k_scale = 0.0  # out of int16 range — skip quantization
+                    if k_scale:
+                        k_i16 = np.round(batch.strike * k_scale).astype(np.int16)
+                        self._d_K[:n] = (cp.asarray(k_i16).astype(cp.float32)
+                                         * np.float32(1.0 / k_scale))
+                    else:
+                        self._d_K[:n].set(batch.strike, stream=self._h2d_stream)
+                    self._chain_key = chain_key
+                # Fields that move every cycle — always refresh in place
+                # (qty included: update_positions can change it mid-chain)
+                self._d_S[:n].set(batch.spot_price, stream=self._h2d_stream)
+                self._d_T[:n].set(batch.time_to_expiry, stream=self._h2d_stream)
+                self._d_qty[:n].set(weights, stream=self._h2d_stream)
+                self._d_qty_valid = n
+                # IV likewise goes up quantized: 4dp resolution under 3.2
+                # vol, 3dp under 32.7; junk quotes beyond that skip
+                # quantization rather than wrap int16
+                sig_max = float(batch.implied_volatility.max())
+                if sig_max < 3.2:
+                    sig_scale = 10000.0
+                elif sig_max < 32.7:
+                    sig_scale = 1000.0
+                else:
+                    sig_scale = 0.0  # out of int16 range — skip quantization
+                if sig_scale:
+                    sig_i16 = np.round(batch.implied_volatility * sig_scale).astype(np.int16)
+                    self._d_sigma[:n] = (cp.asarray(sig_i16).astype(cp.float32)
+                                         * np.float32(1.0 / sig_scale))
+                else:
+                    self._d_sigma[:n].set(batch.implied_volatility, stream=self._h2d_stream)
+            self._h2d_event.record(self._h2d_stream)
+        except Exception as e:
+            print(f"❌ Device buffer upload failed: {e}")
+            self._d_qty_valid = 0
+
+    def _aggregate_greeks(self, greeks_mat, weights):
+        """Reduce per-option Greeks × position weights with a single FP32 GEMV
+
+        When cupy is available the matmul runs under cuBLAS TF32 tensor-core
+        math (~2x FP32 CUDA-core throughput); otherwise numpy FP32 BLAS.
+        Options for one symbol occupy contiguous columns (prepare fills the
+        batch symbol by symbol), so the reduction streams whole blocks.
+        """
+        if CUPY_AVAILABLE and self._copy_stream is not None:
+            try:
+                n_greeks, n_options = greeks_mat.shape
+                # Pad both GEMV dims to multiples of 16 so cuBLAS can tile
+                # the reduction onto 16x16x16 WMMA fragments; the zero
+                # padding contributes nothing to the totals
+                n_pad = ((n_options + 15) // 16) * 16
+                d_mat = cp.zeros((16, n_pad), dtype=cp.float32)
+                d_mat[:n_greeks, :n_options] = cp.asarray(greeks_mat)
+                d_w = cp.zeros(n_pad, dtype=cp.float32)
+                if self._d_qty_valid >= n_options:
+                    # Weights are already resident from the per-cycle upload;
+                    # order against the in-flight H2D copies before reading
+                    cp.cuda.get_current_stream().wait_event(self._h2d_event)
+                    d_w[:n_options] = self._d_qty[:n_options]
+                else:
+                    d_w[:n_options] = cp.asarray(weights)
+
+                handle = cp.cuda.device.get_cublas_handle()
+                cp.cuda.cublas.setMathMode(
+                    handle, cp.cuda.cublas.CUBLAS_TF32_TENSOR_OP_MATH)
+                d_totals = d_mat @ d_w
+
+                # The GEMV runs on the current (default) stream and the copy
+                # stream is non-blocking, so fence the copy behind an event
+                # recorded after the matmul — otherwise the DMA could read
+                # the result buffer before cuBLAS has written it
+                gemv_done = cp.cuda.Event()
+                gemv_done.record()
+                self._copy_stream.wait_event(gemv_done)
+
+                # Single async D2H into the pinned buffer (DMA-capable), then
+                # one synchronize — readers never touch the GPU again
+                d_totals.get(stream=self._copy_stream, out=self._h_totals)
+                self._copy_stream.synchronize()
+                return self._h_totals[:n_greeks]
+            except Exception as e:
+                print(f"❌ TF32 aggregation failed, using CPU BLAS: {e}")
+        return greeks_mat @ weights
+
     def _update_current_greeks(self, total_greeks):
         """Helper to update current Greeks"""
         self.current_greeks = PortfolioGreeks(